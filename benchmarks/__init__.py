@@ -0,0 +1,9 @@
+"""
+Standalone benchmarks, run from the repo root with python -m benchmarks.<name>.
+Settings are filled with throwaway values and an in-memory sqlite database unless already set in the environment.
+"""
+import os
+
+for key, value in {"DATABASE_URL": "sqlite://", "JWT_KEY": "bench", "ALGORITHM": "HS256", "ADMIN_KEY": "bench",
+                   "USER_PORT": "5000", "EMAIL_USER": "bench", "EMAIL_PASS": "bench", "BOOK_PORT": "5001"}.items():
+    os.environ.setdefault(key, value)
@@ -0,0 +1,40 @@
+"""
+CPU vs bytes benchmark for response compression.
+Compresses book listing payloads of several sizes with every available encoding over a range of levels.
+
+Run from the repo root: python -m benchmarks.bench_compression
+"""
+import time
+
+import orjson
+
+from core.compression import COMPRESSORS, available_encodings
+
+SIZES = [100, 10_000, 100_000]
+LEVELS = {"br": [1, 4, 6, 9], "zstd": [1, 3, 9, 15], "gzip": [1, 6, 9]}
+ROUNDS = 3
+
+
+def payload(books):
+    data = [{"id": i + 1, "name": f"Book {i}", "author": f"Author {i % 500}", "price": i % 900, "quantity": i % 50}
+            for i in range(books)]
+    return orjson.dumps({"msg": "Retrieved all books", "status": 200, "data": data})
+
+
+def main():
+    for books in SIZES:
+        body = payload(books)
+        print(f"\n{books} books, {len(body)} bytes uncompressed")
+        for encoding in available_encodings(LEVELS):
+            for level in LEVELS[encoding]:
+                best = float("inf")
+                for _ in range(ROUNDS):
+                    start = time.perf_counter()
+                    compressed = COMPRESSORS[encoding](body, level)
+                    best = min(best, time.perf_counter() - start)
+                print(f"  {encoding:<5} level {level:<3} {best * 1000:9.2f} ms  {len(compressed):>10} bytes  "
+                      f"ratio {len(body) / len(compressed):6.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Overhead benchmark for the rate limiter.
+Times a bare bucket consume for each store and the full rate_limit decorator inside a request context.
+
+Run from the repo root: python -m benchmarks.bench_ratelimit
+"""
+import os
+import tempfile
+import time
+
+from core import create_app
+from core.ratelimit import MemoryBucketStore, SQLiteBucketStore, rate_limit
+
+CALLS = 100_000
+KEYS = 1_000
+
+
+def per_call(func, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        func(i)
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    memory = MemoryBucketStore()
+    print(f"memory consume        {per_call(lambda i: memory.consume(f'k{i % KEYS}', 10 ** 9, 1), CALLS):8.2f} us")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite = SQLiteBucketStore(os.path.join(tmp, "ratelimit.db"))
+        calls = CALLS // 10
+        print(f"sqlite consume        {per_call(lambda i: sqlite.consume(f'k{i % KEYS}', 10 ** 9, 1), calls):8.2f} us")
+
+    app = create_app(config_mode="development")
+    app.config["RATELIMIT_POLICIES"]["bench"] = {"capacity": 10 ** 9, "per_second": 1, "key": "ip"}
+    plain = lambda: None  # noqa: E731
+    limited = rate_limit("bench")(plain)
+    with app.test_request_context("/", environ_base={"REMOTE_ADDR": "10.0.0.1"}):
+        baseline = per_call(lambda i: plain(), CALLS)
+        print(f"decorated endpoint    {per_call(lambda i: limited(), CALLS) - baseline:8.2f} us over a bare call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Benchmark for the book listing serialization path.
+Compares ORM instances + to_dict + stdlib json against column tuples + the orjson provider on a 100k-book table.
+
+Run from the repo root: python -m benchmarks.bench_serialization
+"""
+import time
+
+from flask.json.provider import DefaultJSONProvider
+from core import create_app, db
+from core.serializers import ORJSONProvider
+from core.utils import select_dicts
+from book.models import Book
+
+BOOKS = 100_000
+ROUNDS = 5
+
+
+def timed(func):
+    best = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        body = func()
+        best = min(best, time.perf_counter() - start)
+        db.session.expunge_all()
+    return best, len(body)
+
+
+def main():
+    app = create_app(config_mode="development")
+    app.debug = False
+    with app.app_context():
+        db.create_all()
+        rows = [{"id": i + 1, "name": f"Book {i}", "author": f"Author {i % 500}", "price": i % 900, "quantity": i % 50}
+                for i in range(BOOKS)]
+        db.session.execute(db.insert(Book), rows)
+        db.session.commit()
+
+        stdlib, fast = DefaultJSONProvider(app), ORJSONProvider(app)
+        cases = {
+            "orm + to_dict + json": lambda: stdlib.dumps([book.to_dict for book in Book.query.all()]),
+            "orm + to_dict + orjson": lambda: fast.dumps([book.to_dict for book in Book.query.all()]),
+            "select_dicts + json": lambda: stdlib.dumps(select_dicts(Book)),
+            "select_dicts + orjson": lambda: fast.dumps(select_dicts(Book)),
+        }
+        for name, func in cases.items():
+            seconds, size = timed(func)
+            print(f"{name:<26} {seconds * 1000:9.1f} ms  {size:>10} bytes")
+
+
+if __name__ == "__main__":
+    main()
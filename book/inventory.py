@@ -0,0 +1,127 @@
+import secrets
+import threading
+from array import array
+from bisect import bisect_left
+from collections import deque
+
+from core import db
+from .models import Book
+
+
+class InventorySnapshot:
+    """
+    Process-local id -> quantity view of the book table, kept as two parallel sorted arrays.
+    Every write bumps `version` and is appended to a bounded change log so clients can ask for the changes since
+    the version they last saw. The high bits of a version hold a random epoch picked on every load, so a version
+    handed out before a restart, or by another process, is recognised as foreign and gets a full snapshot.
+
+    Only writes made through this process are seen, so the book service must run as a single worker process for the
+    snapshot and its deltas to be complete.
+    """
+
+    EPOCH_SHIFT = 32
+
+    def __init__(self, changelog_size=10000):
+        self.ids = array('q')
+        self.quantities = array('q')
+        self.changes = deque(maxlen=changelog_size)  # (version, book_id)
+        self.version = 0
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def load(self):
+        """
+        Description: (Re)build the snapshot from the book table. Needs an app context.
+        Return: None
+        """
+        with self.lock:
+            self._load()
+
+    def _load(self):
+        # The table is read under the lock, so a set() of a write committed after the read waits and lands on top
+        rows = db.session.execute(db.select(Book.id, Book.quantity).order_by(Book.id)).all()
+        self.ids = array('q', (row[0] for row in rows))
+        self.quantities = array('q', (row[1] or 0 for row in rows))
+        self.changes.clear()
+        # Stays below 2**53 so versions survive JSON clients that parse numbers as doubles.
+        self.version = (secrets.randbits(20) + 1) << self.EPOCH_SHIFT
+        self.loaded = True
+
+    def _ensure_loaded(self):
+        if not self.loaded:
+            with self.lock:
+                if not self.loaded:
+                    self._load()
+
+    def set(self, book_id, quantity):
+        """
+        Description: Record the current quantity of a book, inserting it if it is new.
+        Parameter: book_id: int, quantity: int
+        Return: None
+        """
+        self._ensure_loaded()
+        with self.lock:
+            book_id = int(book_id)
+            index = bisect_left(self.ids, book_id)
+            if index < len(self.ids) and self.ids[index] == book_id:
+                self.quantities[index] = quantity or 0
+            else:
+                self.ids.insert(index, book_id)
+                self.quantities.insert(index, quantity or 0)
+            self._record(book_id)
+
+    def remove(self, book_id):
+        """
+        Description: Drop a deleted book from the snapshot.
+        Parameter: book_id: int
+        Return: None
+        """
+        self._ensure_loaded()
+        with self.lock:
+            book_id = int(book_id)
+            index = bisect_left(self.ids, book_id)
+            if index < len(self.ids) and self.ids[index] == book_id:
+                del self.ids[index]
+                del self.quantities[index]
+            self._record(book_id)
+
+    def _record(self, book_id):
+        self.version += 1
+        self.changes.append((self.version, book_id))
+
+    def _quantity(self, book_id):
+        index = bisect_left(self.ids, book_id)
+        if index < len(self.ids) and self.ids[index] == book_id:
+            return self.quantities[index]
+        return None
+
+    def since(self, version):
+        """
+        Description: Changes after `version`. Falls back to the full snapshot when `version` is missing, was not
+            issued by this snapshot since its last load, or is older than the change log still covers.
+        Parameter: version: int or None
+        Return: dict with the current version, whether it is a full snapshot, and [book_id, quantity] pairs where a
+            quantity of None means the book was deleted
+        """
+        self._ensure_loaded()
+        with self.lock:
+            oldest = self.changes[0][0] - 1 if self.changes else self.version
+            if (version is None or version >> self.EPOCH_SHIFT != self.version >> self.EPOCH_SHIFT
+                    or version < oldest or version > self.version):
+                return {"version": self.version, "full": True, "items": list(map(list, zip(self.ids, self.quantities)))}
+            changed = {book_id for change_version, book_id in self.changes if change_version > version}
+            return {"version": self.version, "full": False,
+                    "items": [[book_id, self._quantity(book_id)] for book_id in sorted(changed)]}
+
+    def low_stock(self, threshold):
+        """
+        Description: Books whose quantity is at or below `threshold`.
+        Parameter: threshold: int
+        Return: list of [book_id, quantity] pairs ordered by book_id
+        """
+        self._ensure_loaded()
+        with self.lock:
+            return [[book_id, quantity] for book_id, quantity in zip(self.ids, self.quantities) if quantity <= threshold]
+
+
+inventory = InventorySnapshot()
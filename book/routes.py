@@ -1,9 +1,12 @@
 from core import create_app, db
 from .models import Book
+from .inventory import inventory
 from .schemas import BookValidator
-from flask import request, jsonify, make_response
+from flask import request, jsonify, make_response, Response
 from flask_restx import Api, Resource
-from core.utils import verify_user, verify_superuser
+from core.utils import verify_user, verify_superuser, select_dicts
+from core.serializers import output_json
+from core.events import EventBus, sse_stream
 from .swagger_book_schema import models
 
 app = create_app(config_mode="development")
@@ -14,6 +17,8 @@ api = Api(app,
           security='Bearer',
           doc='/docs',
           authorizations={"Bearer": {"type": "apiKey", "in": "header", "name": "authorization"}})
+api.representation('application/json')(output_json)
+events = EventBus(history_size=app.config["EVENTS_HISTORY_SIZE"])
 
 
 @api.route("/book")
@@ -39,8 +44,7 @@ class BookAPI(Resource):
                 if book is None:
                     return {"msg": "Book ID not found", "status": 404}
                 return {"msg": "Retrieved book", "status": 200, "data": book.to_dict}
-            all_books = Book.query.all()
-            response_data = [book.to_dict for book in all_books]
+            response_data = select_dicts(Book)
             return {"msg": "Retrieved all books", "status": 200, "data": response_data}
         except Exception as e:
             return {"message": str(e), "status": 400}
@@ -58,6 +62,8 @@ class BookAPI(Resource):
             book = Book(**serializer.model_dump())
             db.session.add(book)
             db.session.commit()
+            inventory.set(book.id, book.quantity)
+            events.publish("book_created", app.json.dumps(book.to_dict))
             return make_response(jsonify({"msg": "Book Created Successfully", "status": 201, "data": book.to_dict}),
                                  201)
         except Exception as e:
@@ -84,6 +90,8 @@ class BookAPI(Resource):
                 return make_response(jsonify({"msg": "Book Not Found", "status": 404}), 404)
             [setattr(book, x, y) for x, y in serializer.model_dump().items()]
             db.session.commit()
+            inventory.set(book.id, book.quantity)
+            events.publish("book_updated", app.json.dumps(book.to_dict))
             return make_response({"msg": "Book Updated Successfully", "status": 200, "data": book.to_dict},
                                  200)
         except Exception as e:
@@ -107,41 +115,117 @@ class BookAPI(Resource):
                 return make_response(jsonify({"msg": "Book Not Found", "status": 404}), 404)
             db.session.delete(book)
             db.session.commit()
+            inventory.remove(book_id)
+            events.publish("book_deleted", app.json.dumps({"id": int(book_id)}))
             return make_response(jsonify({"msg": "Book Deleted Successfully", "status": 200}), 200)
         except Exception as e:
             return {"message": str(e), "status": 400}, 400
 
 
+@api.route("/inventory")
+class InventoryAPI(Resource):
+
+    @api.doc(params={'since': 'Version returned by a previous call, omit for the full snapshot'})
+    @verify_superuser
+    def get(self, **kwargs):
+        """
+        Description: Get stock levels as compact [book_id, quantity] pairs.
+            With `since`, only books changed after that version are returned (quantity null for deleted books),
+            unless the version is too old or was issued before a restart, in which case the full snapshot is sent.
+            The snapshot is per process, so the book service has to run as a single worker.
+        Returns:
+            dict: A JSON response with the snapshot version, a `full` flag and the items.
+        """
+        try:
+            since = request.args.get('since', type=int)
+            return {"msg": "Retrieved inventory", "status": 200, "data": inventory.since(since)}
+        except Exception as e:
+            return {"message": str(e), "status": 400}, 400
+
+
+@api.route("/inventory/low_stock")
+class LowStockAPI(Resource):
+
+    @api.doc(params={'threshold': 'Quantity at or below which a book counts as low stock'})
+    @verify_superuser
+    def get(self, **kwargs):
+        """
+        Description: Get books whose quantity is at or below the threshold.
+        Returns:
+            dict: A JSON response with [book_id, quantity] pairs.
+        """
+        try:
+            threshold = request.args.get('threshold', app.config["INVENTORY_LOW_STOCK_THRESHOLD"], type=int)
+            return {"msg": "Retrieved low stock books", "status": 200, "data": inventory.low_stock(threshold)}
+        except Exception as e:
+            return {"message": str(e), "status": 400}, 400
+
+
 @app.route('/set_quantity', methods=['PUT'])
 def set_book_quantity():
     """
     Description:
             Updates book quantities based on provided data, ensuring stock limits aren't exceeded.
+            Stock given back (a negative amount) for a book that has since been deleted is skipped.
     :return:
         Response (Success): Status Code: 201 (Created)  (Data: Details of the created order.)
         Response (Error): Status Code: 404 (Not Found) (if the cart is not found.)
+        Status Code: 409 (Conflict) (if a book does not have enough stock, nothing is changed.)
         Status Code: 400 (Bad Request) (with an error message if any other error occurs.)
     """
     try:
         books = request.json.get('book_data')
+        updated = []
         for i in books:
             book = Book.query.get(i[0])
+            if book is None:
+                if i[1] < 0:
+                    continue
+                raise Exception("Book Not Found")
             if book.quantity - i[1] < 0:
-                raise Exception("Book Quantity exceeds stock limit")
+                db.session.rollback()
+                return make_response({"msg": "Book Quantity exceeds stock limit", "status": 409}, 409)
             book.quantity -= i[1]
+            updated.append((book.id, book.quantity))
         db.session.commit()
+        for book_id, quantity in updated:
+            inventory.set(book_id, quantity)
+            events.publish("quantity_changed", app.json.dumps({"id": book_id, "quantity": quantity}))
         return make_response({"msg": "success", "status": 200}, 200)
     except Exception as e:
         return make_response({"msg": str(e), "status": 400}, 400)
 
 
+@app.route('/events', methods=['GET'])
+def book_events():
+    """
+    Description:
+            Server-sent event stream of book changes: book_created, book_updated, book_deleted and quantity_changed.
+            Clients resume with the Last-Event-ID header (or last_event_id query string) and get a reset event when
+            the changes since that id are no longer available or the id was issued before a restart.
+            The bus is per process and only sees writes made through it, so the book service has to run as a single
+            worker.
+    :return:
+        Response (Success): Status Code: 200 (text/event-stream)
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = 0  # never in the history, so the client gets a reset rather than a silent gap
+    stream = sse_stream(events, last_event_id,
+                        heartbeat=app.config["EVENTS_HEARTBEAT_SECONDS"])
+    return Response(stream, mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @app.route('/get_book_by_id', methods=['GET'])
 def get_book():
     try:
         book_id = request.args.get('book_id')
         book = Book.query.filter_by(id=book_id).one_or_none()  # getting requested book from db
         if not book:
-            return jsonify({"message": "Book Not Found"}, 404)
+            return make_response({"message": "Book Not Found"}, 404)
         return make_response(book.to_dict, 200)
     except Exception as e:
         return make_response({"msg": str(e), "status": 400}, 400)
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta, date
+
+from core import db
+from settings import setting
+from .models import Cart, CartItems, Order, OrderLine
+
+
+def archive_orders(app):
+    """
+    Description: Move ordered carts older than ORDER_ARCHIVE_AFTER_SECONDS, and their cart items, into the
+        order/order_line tables. Works in batches of ORDER_ARCHIVE_BATCH, each in its own short transaction, and skips
+        rows locked by a concurrent mover so several can run at once.
+    :param app: cart Flask app
+    :return: number of orders archived
+    """
+    batch_size = app.config["ORDER_ARCHIVE_BATCH"]
+    archived = 0
+    with app.app_context():
+        cutoff = datetime.utcnow() - timedelta(seconds=app.config["ORDER_ARCHIVE_AFTER_SECONDS"])
+        while True:
+            cart_ids = [row[0] for row in db.session.execute(
+                db.select(Cart.id).where(Cart.is_ordered.is_(True),
+                                         db.or_(Cart.ordered_at <= cutoff, Cart.ordered_at.is_(None)))
+                .order_by(Cart.id).limit(batch_size).with_for_update(skip_locked=True))]
+            if not cart_ids:
+                break
+            # Orders placed before ordered_at existed fall back to their last update time
+            ordered_at = db.func.coalesce(Cart.ordered_at, Cart.updated_at, datetime.utcnow())
+            db.session.execute(db.insert(Order.__table__).from_select(
+                ["id", "total_price", "total_quantity", "user_id", "ordered_at"],
+                db.select(Cart.id, Cart.total_price, Cart.total_quantity, Cart.user_id, ordered_at)
+                .where(Cart.id.in_(cart_ids))))
+            db.session.execute(db.insert(OrderLine.__table__).from_select(
+                ["id", "price", "quantity", "book_id", "order_id", "ordered_at"],
+                db.select(CartItems.id, CartItems.price, CartItems.quantity, CartItems.book_id, CartItems.cart_id,
+                          ordered_at)
+                .join(Cart, Cart.id == CartItems.cart_id).where(CartItems.cart_id.in_(cart_ids))))
+            CartItems.query.filter(CartItems.cart_id.in_(cart_ids)).delete(synchronize_session=False)
+            Cart.query.filter(Cart.id.in_(cart_ids)).delete(synchronize_session=False)
+            db.session.commit()
+            archived += len(cart_ids)
+    return archived
+
+
+def create_order_partitions(app, months_ahead=3):
+    """
+    Description: Create monthly partitions of order/order_line from the current month up to `months_ahead` months
+        ahead, plus a default partition for anything outside them. Only applies to PostgreSQL with
+        ORDER_PARTITIONING enabled, where the tables are created partitioned on ordered_at.
+    :param app: cart Flask app
+    :param months_ahead: how many future months to prepare
+    :return: list of partition names that now exist
+    """
+    if not setting.ORDER_PARTITIONING:
+        raise Exception("ORDER_PARTITIONING is not enabled")
+    names = []
+    with app.app_context():
+        if db.engine.dialect.name != "postgresql":
+            raise Exception("Order partitioning needs PostgreSQL")
+        today = date.today()
+        for table in (Order.__tablename__, OrderLine.__tablename__):
+            default = f"{table}_default"
+            db.session.execute(db.text(f'CREATE TABLE IF NOT EXISTS "{default}" PARTITION OF "{table}" DEFAULT'))
+            names.append(default)
+            for offset in range(months_ahead + 1):
+                year, month = divmod(today.month - 1 + offset, 12)
+                start = date(today.year + year, month + 1, 1)
+                year, month = divmod(start.month, 12)
+                end = date(start.year + year, month + 1, 1)
+                name = f"{table}_{start:%Y_%m}"
+                db.session.execute(db.text(f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" '
+                                           f"FOR VALUES FROM ('{start}') TO ('{end}')"))
+                names.append(name)
+        db.session.commit()
+    return names
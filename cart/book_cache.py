@@ -0,0 +1,97 @@
+import json
+import threading
+import time
+
+import httpx
+
+
+class BookCache:
+    """
+    Book snapshots fetched from the book service, trusted only while subscribed to its event stream.
+    A background thread listens to /events and drops entries as books change. While the stream is down the cache is
+    bypassed; on reconnect the missed events are replayed from Last-Event-ID, or everything is dropped on a reset.
+    """
+
+    def __init__(self, retry_delay=5):
+        self.books = {}
+        self.generation = 0  # bumped on every invalidation, guards against storing a fetch that raced an event
+        self.last_event_id = None
+        self.connected = threading.Event()
+        self.retry_delay = retry_delay
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self, events_url):
+        """
+        Description: Start the subscriber thread once.
+        Parameter: events_url: URL of the book service event stream
+        Return: None
+        """
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._listen, args=(events_url,), daemon=True)
+                self.thread.start()
+
+    def get(self, book_id, fetch):
+        """
+        Description: Return the cached book, or fetch and cache it while the event stream is connected.
+        Parameter: book_id: int, fetch: callable(book_id) returning the book dict or None when not found
+        Return: book dict or None
+        """
+        if not self.connected.is_set():
+            return fetch(book_id)
+        book = self.books.get(book_id)
+        if book is not None:
+            return book
+        generation = self.generation
+        book = fetch(book_id)
+        with self.lock:
+            if book is not None and generation == self.generation and self.connected.is_set():
+                self.books[book_id] = book
+        return book
+
+    def invalidate(self, book_id=None):
+        with self.lock:
+            self.generation += 1
+            if book_id is None:
+                self.books.clear()
+            else:
+                self.books.pop(book_id, None)
+
+    def _listen(self, events_url):
+        while True:
+            try:
+                headers = {"Last-Event-ID": str(self.last_event_id)} if self.last_event_id else {}
+                with httpx.stream("GET", events_url, headers=headers, timeout=httpx.Timeout(5, read=None)) as response:
+                    response.raise_for_status()
+                    self._consume(response.iter_lines())
+            except Exception:
+                pass
+            self.connected.clear()
+            time.sleep(self.retry_delay)
+
+    def _consume(self, lines):
+        event_id = event = data = None
+        for line in lines:
+            if line.startswith("id: "):
+                event_id = int(line[4:])
+            elif line.startswith("event: "):
+                event = line[7:]
+            elif line.startswith("data: "):
+                data = line[6:]
+            elif line == "" and event is not None:
+                self._apply(event, data)
+                self.last_event_id = event_id
+                event_id = event = data = None
+
+    def _apply(self, event, data):
+        if event == "ready":
+            # Everything missed while disconnected has been replayed, live events follow from here.
+            self.connected.set()
+        elif event == "reset":
+            self.invalidate()
+        elif event in ("book_created", "book_updated", "book_deleted", "quantity_changed"):
+            self.invalidate(json.loads(data)["id"])
+
+
+book_cache = BookCache()
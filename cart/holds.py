@@ -0,0 +1,182 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+from core import db
+from .models import Cart, CartItems
+from .archive import archive_orders
+
+
+class InsufficientStock(Exception):
+    """Raised when the book service refuses a change because a book does not have enough stock."""
+
+
+def adjust_stock(book_service_url, book_data):
+    """
+    Description: Change book quantities through the book service. Positive amounts take stock, negative amounts
+        give it back.
+    :param book_service_url: scheme, host and port of the book service
+    :param book_data: list of [book_id, amount]
+    :return: None, raises InsufficientStock if a book does not have enough stock, or Exception with the book service
+        message if it refuses the change for another reason
+    """
+    book_data = [entry for entry in book_data if entry[1]]
+    if not book_data:
+        return
+    response = httpx.put(url=f"{book_service_url}/set_quantity", json={"book_data": book_data})
+    if response.status_code == 409:
+        raise InsufficientStock(response.json()['msg'])
+    if response.status_code >= 400:
+        raise Exception(response.json()['msg'])
+
+
+def hold_stock(book_service_url, cart_item, quantity, hold_seconds):
+    """
+    Description: Reserve stock for a cart item so checkout cannot fail on it until the hold expires.
+        A persisted item is locked and its current hold claimed in the caller's transaction, so concurrent updates
+        of the same item take turns and each only takes or gives back the difference to the hold it found.
+        The caller commits; on failure the transaction is rolled back, which puts the hold back.
+    :param book_service_url: scheme, host and port of the book service
+    :param cart_item: CartItems row, new or persisted
+    :param quantity: quantity the item is being set to
+    :param hold_seconds: how long the hold lasts
+    :return: None, raises InsufficientStock if the book service does not have enough stock, or Exception if the
+        change failed for another reason
+    """
+    claimed = []
+    if cart_item.id:
+        CartItems.query.filter_by(id=cart_item.id).populate_existing().with_for_update().one()
+        claimed = claim_holds([cart_item], commit=False)
+    try:
+        adjust_stock(book_service_url, [[cart_item.book_id, quantity - sum(held for _, _, held in claimed)]])
+    except Exception:
+        db.session.rollback()
+        raise
+    cart_item.held_quantity = quantity
+    cart_item.hold_expires_at = datetime.utcnow() + timedelta(seconds=hold_seconds)
+
+
+def claim_holds(cart_items, expired_before=None, commit=True):
+    """
+    Description: Atomically take over the holds of the given items by zeroing them, so a hold is never released or
+        consumed twice by concurrent requests and sweepers. A hold is only claimed while both its quantity and
+        expiry are still the ones read, so a hold that was claimed and re-created in the meantime is left alone.
+    :param cart_items: iterable of CartItems rows
+    :param expired_before: when given, only holds expiring before this time are claimed
+    :param commit: commit the claims, or leave them in the caller's transaction
+    :return: list of (cart_item_id, book_id, claimed_quantity) for the holds that were claimed
+    """
+    claimed = []
+    for item in cart_items:
+        if not item.held_quantity:
+            continue
+        query = CartItems.query.filter_by(id=item.id, held_quantity=item.held_quantity,
+                                          hold_expires_at=item.hold_expires_at)
+        if expired_before is not None:
+            query = query.filter(CartItems.hold_expires_at < expired_before)
+        updated = query.update({"held_quantity": 0, "hold_expires_at": None}, synchronize_session=False)
+        if updated:
+            claimed.append((item.id, item.book_id, item.held_quantity))
+    if commit:
+        db.session.commit()
+    return claimed
+
+
+def restore_holds(claimed, hold_seconds):
+    """
+    Description: Put claimed holds back after the book service call that was meant to use them failed.
+    :param claimed: list returned by claim_holds
+    :param hold_seconds: how long the restored holds last
+    :return: None
+    """
+    expires_at = datetime.utcnow() + timedelta(seconds=hold_seconds)
+    for item_id, book_id, quantity in claimed:
+        CartItems.query.filter_by(id=item_id).update({"held_quantity": quantity, "hold_expires_at": expires_at},
+                                                     synchronize_session=False)
+    db.session.commit()
+
+
+def release_holds(book_service_url, cart_items, expired_before=None):
+    """
+    Description: Give the held stock of the given items back to the book service.
+    :param book_service_url: scheme, host and port of the book service
+    :param cart_items: iterable of CartItems rows
+    :param expired_before: when given, only holds expiring before this time are released
+    :return: number of holds released
+    """
+    claimed = claim_holds(cart_items, expired_before)
+    try:
+        adjust_stock(book_service_url, [[book_id, -quantity] for item_id, book_id, quantity in claimed])
+    except Exception:
+        restore_holds(claimed, 0)
+        raise
+    return len(claimed)
+
+
+def sweep(app):
+    """
+    Description: Release expired stock holds and purge unordered carts that have not been touched for
+        CART_EXPIRY_SECONDS, together with their cart items, in batches of CART_SWEEP_BATCH.
+        Each purge batch locks its carts and skips rows locked by a concurrent request or sweeper, then gives back
+        their holds and deletes them in the same transaction, so a cart touched meanwhile is never purged.
+        Carts from before updated_at existed have no update time and count as stale.
+    :param app: cart Flask app
+    :return: (released holds, purged carts)
+    """
+    batch_size = app.config["CART_SWEEP_BATCH"]
+    book_service_url = app.config["BOOK_SERVICE_URL"]
+    released = purged = 0
+    with app.app_context():
+        while True:
+            now = datetime.utcnow()
+            expired = (CartItems.query.join(Cart, Cart.id == CartItems.cart_id)
+                       .filter(Cart.is_ordered.is_(False), CartItems.held_quantity > 0,
+                               CartItems.hold_expires_at < now)
+                       .limit(batch_size).all())
+            if not expired:
+                break
+            released += release_holds(book_service_url, expired, expired_before=now)
+
+        stale_before = datetime.utcnow() - timedelta(seconds=app.config["CART_EXPIRY_SECONDS"])
+        while True:
+            cart_ids = [row[0] for row in db.session.execute(
+                db.select(Cart.id).where(Cart.is_ordered.is_(False),
+                                         db.or_(Cart.updated_at < stale_before, Cart.updated_at.is_(None)))
+                .limit(batch_size).with_for_update(skip_locked=True))]
+            if not cart_ids:
+                db.session.rollback()
+                break
+            claimed = claim_holds(CartItems.query.filter(CartItems.cart_id.in_(cart_ids),
+                                                         CartItems.held_quantity > 0).all(), commit=False)
+            adjust_stock(book_service_url, [[book_id, -quantity] for item_id, book_id, quantity in claimed])
+            CartItems.query.filter(CartItems.cart_id.in_(cart_ids)).delete(synchronize_session=False)
+            Cart.query.filter(Cart.id.in_(cart_ids)).delete(synchronize_session=False)
+            db.session.commit()
+            purged += len(cart_ids)
+    return released, purged
+
+
+def start_sweeper(app):
+    """
+    Description: Run sweep and the order archiver every CART_SWEEP_INTERVAL seconds in a daemon thread.
+        A failure in one of them is logged and does not stop the other.
+    :param app: cart Flask app
+    :return: the started thread
+    """
+
+    def run():
+        while True:
+            for name, job in (("Cart sweep", sweep), ("Order archive", archive_orders)):
+                try:
+                    job(app)
+                except Exception as e:
+                    app.logger.warning("%s failed: %s", name, e)
+                    with app.app_context():
+                        db.session.rollback()
+            time.sleep(app.config["CART_SWEEP_INTERVAL"])
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
@@ -1,14 +1,20 @@
+from datetime import datetime
+
 from core import db
+from settings import setting
 
 
 class Cart(db.Model):
     __tablename__ = 'cart'
+    __table_args__ = (db.Index("ix_cart_user_id_is_ordered", "user_id", "is_ordered"),)
 
     id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
     total_price = db.Column(db.Integer, default=0)
     total_quantity = db.Column(db.Integer, default=0)
     is_ordered = db.Column(db.Boolean, default=False)
     user_id = db.Column(db.BigInteger, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    ordered_at = db.Column(db.DateTime, index=True)
 
     @property
     def to_dict(self):
@@ -18,14 +24,57 @@ class Cart(db.Model):
 
 class CartItems(db.Model):
     __tablename__ = "cart_items"
+    # Columns that may be returned to clients, the same ones to_dict exposes
+    public_fields = ("id", "price", "quantity", "book_id", "cart_id")
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     price = db.Column(db.Integer, default=0)
     quantity = db.Column(db.Integer, default=0)
     book_id = db.Column(db.BigInteger, nullable=False)
-    cart_id = db.Column(db.BigInteger, nullable=False)
+    cart_id = db.Column(db.BigInteger, nullable=False, index=True)
+    held_quantity = db.Column(db.Integer, default=0)  # stock currently reserved in the book service for this item
+    hold_expires_at = db.Column(db.DateTime, index=True)
 
     @property
     def to_dict(self):
         return {"id": self.id, "price": self.price, "quantity": self.quantity, "book_id": self.book_id,
                 "cart_id": self.cart_id}
+
+
+# Completed orders are moved out of cart/cart_items into these tables by cart.archive, keeping their ids.
+# With ORDER_PARTITIONING set they are created range-partitioned on ordered_at (PostgreSQL), which needs the
+# partition key in the primary key.
+_partition_args = {"postgresql_partition_by": "RANGE (ordered_at)"} if setting.ORDER_PARTITIONING else {}
+
+
+class Order(db.Model):
+    __tablename__ = "order"
+    __table_args__ = _partition_args
+
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    total_price = db.Column(db.Integer, default=0)
+    total_quantity = db.Column(db.Integer, default=0)
+    user_id = db.Column(db.BigInteger, nullable=False, index=True)
+    ordered_at = db.Column(db.DateTime, nullable=False, primary_key=setting.ORDER_PARTITIONING, index=True)
+
+    @property
+    def to_dict(self):
+        return {"id": self.id, "total_price": self.total_price, "total_quantity": self.total_quantity,
+                "is_ordered": True, "user_id": self.user_id}
+
+
+class OrderLine(db.Model):
+    __tablename__ = "order_line"
+    __table_args__ = _partition_args
+
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    price = db.Column(db.Integer, default=0)
+    quantity = db.Column(db.Integer, default=0)
+    book_id = db.Column(db.BigInteger, nullable=False)
+    order_id = db.Column(db.BigInteger, nullable=False, index=True)
+    ordered_at = db.Column(db.DateTime, nullable=False, primary_key=setting.ORDER_PARTITIONING)
+
+    @property
+    def to_dict(self):
+        return {"id": self.id, "price": self.price, "quantity": self.quantity, "book_id": self.book_id,
+                "cart_id": self.order_id}
@@ -1,10 +1,18 @@
 from flask import request, jsonify, make_response
 from flask_restx import Api, Resource
-from core.utils import verify_user
+from datetime import datetime
+from core.utils import verify_user, select_dicts
+from core.serializers import output_json
+from core.ratelimit import rate_limit
 from .schemas import CartValidator
 from core import create_app, db
-from .models import Cart, CartItems
+from .models import Cart, CartItems, Order, OrderLine
+from .archive import archive_orders, create_order_partitions
+from .book_cache import book_cache
+from .holds import (hold_stock, claim_holds, restore_holds, release_holds, adjust_stock, sweep, start_sweeper,
+                    InsufficientStock)
 from .swagger_cart_schema import models
+import click
 import httpx
 from settings import setting
 
@@ -16,6 +24,50 @@ api = Api(app=app,
           security='Bearer',
           doc='/docs',
           authorizations={"Bearer": {"type": "apiKey", "in": "header", "name": "authorization"}})
+api.representation('application/json')(output_json)
+if app.config["CART_SWEEPER_ENABLED"]:
+    start_sweeper(app)
+
+
+@app.cli.command("sweep-carts")
+def sweep_carts():
+    """Release expired stock holds and purge abandoned carts."""
+    released, purged = sweep(app)
+    print(f"Released {released} holds, purged {purged} carts")
+
+
+@app.cli.command("archive-orders")
+def archive_orders_command():
+    """Move completed orders out of cart/cart_items into order/order_line."""
+    print(f"Archived {archive_orders(app)} orders")
+
+
+@app.cli.command("create-order-partitions")
+@click.option("--months-ahead", default=3, help="Future months to create partitions for")
+def create_order_partitions_command(months_ahead):
+    """Create monthly order/order_line partitions (PostgreSQL with ORDER_PARTITIONING)."""
+    for name in create_order_partitions(app, months_ahead):
+        print(name)
+
+
+def get_book(base_url, book_id):
+    """
+    Description: Look up a book in the book service, through the event-invalidated cache when it is enabled.
+    :param base_url: scheme and host of the current request
+    :param book_id: ID of the book to look up
+    :return: book data dict, or None if the book service does not know the book
+    """
+
+    def fetch(book_id):
+        response = httpx.get(url=f"{base_url}:{setting.BOOK_PORT}/get_book_by_id", params={"book_id": book_id})
+        if response.status_code >= 400:
+            return None
+        return response.json()
+
+    if not app.config["BOOK_CACHE_ENABLED"]:
+        return fetch(book_id)
+    book_cache.start(f"{base_url}:{setting.BOOK_PORT}/events")
+    return book_cache.get(book_id, fetch)
 
 
 @api.route('/cart')
@@ -26,6 +78,7 @@ class CartAPI(Resource):
     """
 
     @api.doc(body=api.model('cart_schema', models.get('cart_schema')))
+    @rate_limit("cart")
     @verify_user
     def post(self, **kwargs):
         """
@@ -45,14 +98,13 @@ class CartAPI(Resource):
 
             # Checking if the asked book is really in my stock/db or not. Requesting to Book API
             base_url = ":".join(request.url_root.split(":")[:-1])
-            response = httpx.get(url=f"{base_url}:{setting.BOOK_PORT}/get_book_by_id", params={"book_id": data.get(
-                "book_id")})
-            if response.status_code >= 400:
+            book_data = get_book(base_url, data.get("book_id"))
+            if book_data is None:
                 return jsonify({"message": "Book Not Found"}, 404)
-            book_data = response.json()
             print(book_data['quantity'], )
-            # Check if the requested quantity exceeds the available quantity of the book
-            if data.get("quantity") > book_data['quantity']:
+            # Check if the requested quantity exceeds the available quantity of the book. With stock holds the
+            # reservation below does this check against the live stock instead.
+            if not app.config["CART_HOLD_ENABLED"] and data.get("quantity") > book_data['quantity']:
                 return make_response({"message": "Requested quantity exceeds available stock"}, 400)
 
             # Checking if the user is already having cart or not.
@@ -67,10 +119,22 @@ class CartAPI(Resource):
             # If there is a cart, find what cart items are there in the cart_items
             cart_items = CartItems.query.filter_by(book_id=book_data['id'], cart_id=cart.id).one_or_none()
 
-            # if cart_items is not there create cart_items else reset cart_items to 0
+            # if cart_items is not there create cart_items
             if not cart_items:
                 cart_items = CartItems(book_id=book_data['id'], cart_id=cart.id)
-            else:
+
+            # Reserve the stock until the hold expires, so checkout does not fail late
+            if app.config["CART_HOLD_ENABLED"]:
+                try:
+                    hold_stock(f"{base_url}:{setting.BOOK_PORT}", cart_items, data.get("quantity"),
+                               app.config["CART_HOLD_SECONDS"])
+                except InsufficientStock:
+                    return make_response({"message": "Requested quantity exceeds available stock"}, 400)
+                except Exception as e:
+                    return make_response({"message": str(e), "status": 400}, 400)
+
+            # else reset the existing cart_items share of the cart totals to 0
+            if cart_items.id:
                 cart.total_quantity -= cart_items.quantity
                 cart.total_price -= cart_items.price
 
@@ -89,6 +153,7 @@ class CartAPI(Resource):
         except Exception as e:
             return {"message": str(e), "status": 400}, 400
 
+    @rate_limit("cart")
     @verify_user
     def get(self, **kwargs):
         """
@@ -101,13 +166,9 @@ class CartAPI(Resource):
         try:
             cart = Cart.query.filter_by(user_id=kwargs['current_user']['id'], is_ordered=False).one_or_none()
             if cart:
-                # Fetch all cart_items associated with the cart
-                cart_items = CartItems.query.filter_by(cart_id=cart.id).all()
-
-                # Clean up the cart_items data by creating dictionaries for each item without the SQLAlchemy-specific
-                # '_sa_instance_state' attribute.
-                cart_items_data = [{key: value for key, value in item.__dict__.items() if not key.startswith('_')} for
-                                   item in cart_items if item.quantity > 0 and item.price > 0]
+                # Fetch all non-empty cart_items associated with the cart as plain dicts
+                cart_items_data = select_dicts(CartItems, CartItems.cart_id == cart.id, CartItems.quantity > 0,
+                                               CartItems.price > 0, columns=CartItems.public_fields)
 
                 cart_with_cart_items = cart.to_dict
                 cart_with_cart_items['cart_items'] = cart_items_data
@@ -117,6 +178,7 @@ class CartAPI(Resource):
             return {"message": str(e), "status": 400}, 400
 
     @api.doc(params={'cart_id': 'cart_id id to be deleted'})
+    @rate_limit("cart")
     @verify_user
     def delete(self, **kwargs):
         """
@@ -128,6 +190,11 @@ class CartAPI(Resource):
         try:
             cart = Cart.query.filter_by(user_id=kwargs['current_user']['id'], is_ordered=False).one_or_none()
             if cart:
+                # Give back any stock held for the cart before dropping it
+                base_url = ":".join(request.url_root.split(":")[:-1])
+                release_holds(f"{base_url}:{setting.BOOK_PORT}",
+                              CartItems.query.filter(CartItems.cart_id == cart.id, CartItems.held_quantity > 0))
+
                 # Delete all cart_items associated with the cart
                 CartItems.query.filter_by(cart_id=cart.id).delete()
 
@@ -157,14 +224,21 @@ class OrderAPI(Resource):
                                         id=cart_id).one_or_none()
 
             if cart:
-                cart_items = CartItems.query.filter_by(cart_id=cart.id)
-                books = list(map(lambda x: [x.book_id, x.quantity], cart_items))
+                cart_items = CartItems.query.filter_by(cart_id=cart.id).all()
+
+                # Stock already held for an item only needs the remainder taken; expired holds were given back
+                claimed = claim_holds(cart_items)
+                held = {item_id: quantity for item_id, book_id, quantity in claimed}
+                books = [[x.book_id, x.quantity - held.get(x.id, 0)] for x in cart_items]
                 base_url = ":".join(request.url_root.split(":")[:-1])
-                response = httpx.put(url=f"{base_url}:{setting.BOOK_PORT}/set_quantity", json={"book_data": books})
-                if response.status_code >= 400:
-                    raise Exception(response.json()['msg'])
+                try:
+                    adjust_stock(f"{base_url}:{setting.BOOK_PORT}", books)
+                except Exception:
+                    restore_holds(claimed, app.config["CART_HOLD_SECONDS"])
+                    raise
 
                 cart.is_ordered = True
+                cart.ordered_at = datetime.utcnow()
                 db.session.commit()
 
                 return {"msg": "Order Created", "status": 201, "data": cart.to_dict}, 201
@@ -175,26 +249,30 @@ class OrderAPI(Resource):
     @verify_user
     def get(self, **kwargs):
         """
-        Retrieves the user's ordered cart data, including ordered cart items
+        Retrieves the user's latest order, including its ordered items. Orders not yet moved by the archiver are
+        still in the cart tables, so they are checked before the archived order tables.
 
         :param kwargs: Getting current user data
         :return: A JSON response containing the ordered cart data, or a message indicating no ordered items found.
         """
         try:
-            cart = Cart.query.filter_by(user_id=kwargs['current_user']['id'], is_ordered=True).one_or_none()
+            user_id = kwargs['current_user']['id']
+            cart = (Cart.query.filter_by(user_id=user_id, is_ordered=True)
+                    .order_by(Cart.ordered_at.desc().nulls_last(), Cart.id.desc()).first())
             if cart:
-                # Fetch all cart_items associated with the cart
-                cart_items = CartItems.query.filter_by(cart_id=cart.id).all()
-
-                # Clean up the cart_items data by creating dictionaries for each item without the SQLAlchemy-specific
-                # '_sa_instance_state' attribute.
-                cart_items_data = [{key: value for key, value in item.__dict__.items() if not key.startswith('_')} for
-                                   item in cart_items if item.quantity > 0 and item.price > 0]
-
+                # Fetch all non-empty cart_items associated with the cart as plain dicts
+                cart_items_data = select_dicts(CartItems, CartItems.cart_id == cart.id, CartItems.quantity > 0,
+                                               CartItems.price > 0, columns=CartItems.public_fields)
                 cart_with_cart_items = cart.to_dict
-                cart_with_cart_items['cart_items'] = cart_items_data
-                return {"msg": "Ordered Details", "status": 200, "data": cart_with_cart_items}, 200
-            return make_response({"message": "No Ordered Items Found", "status": 404}, 404)
+            else:
+                order = Order.query.filter_by(user_id=user_id).order_by(Order.ordered_at.desc()).first()
+                if not order:
+                    return make_response({"message": "No Ordered Items Found", "status": 404}, 404)
+                cart_items_data = [line.to_dict for line in OrderLine.query.filter(
+                    OrderLine.order_id == order.id, OrderLine.quantity > 0, OrderLine.price > 0)]
+                cart_with_cart_items = order.to_dict
+            cart_with_cart_items['cart_items'] = cart_items_data
+            return {"msg": "Ordered Details", "status": 200, "data": cart_with_cart_items}, 200
         except Exception as e:
             return {"message": e.args[0], "status": 400, "data": {}}, 400
 
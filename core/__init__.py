@@ -2,6 +2,9 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from .config import config_dict
+from .serializers import ORJSONProvider
+from .compression import compress_response
+from .ratelimit import init_rate_limiter
 
 db = SQLAlchemy()
 migrate = Migrate()
@@ -9,7 +12,10 @@ migrate = Migrate()
 
 def create_app(config_mode):
     app = Flask(__name__)
+    app.json = ORJSONProvider(app)
     app.config.from_object(config_dict.get(config_mode))
     db.init_app(app)
     migrate.init_app(app, db)
+    app.after_request(compress_response(app))
+    init_rate_limiter(app)
     return app
@@ -0,0 +1,64 @@
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, the encoding is simply not offered without it
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional, the encoding is simply not offered without it
+    zstandard = None
+
+COMPRESSORS = {
+    "br": (lambda data, level: brotli.compress(data, quality=level)) if brotli else None,
+    "zstd": (lambda data, level: zstandard.ZstdCompressor(level=level).compress(data)) if zstandard else None,
+    "gzip": lambda data, level: gzip.compress(data, compresslevel=level, mtime=0),
+}
+
+
+def available_encodings(preferred):
+    """
+    Description: Filter the configured encodings down to the ones whose compressor is importable.
+    Parameter: preferred: iterable of encoding names in server preference order
+    Return: list of usable encoding names, preference order kept
+    """
+    return [name for name in preferred if COMPRESSORS.get(name)]
+
+
+def compress_response(app):
+    """
+    Description: Build an after_request hook that compresses response bodies with the best encoding the client
+        accepts. Responses that are streamed, passed through, already encoded, too small or not of a compressible
+        mimetype are returned untouched.
+    Parameter: app: Flask app whose COMPRESS_* config is used
+    Return: the hook function
+    """
+    encodings = available_encodings(app.config["COMPRESS_ALGORITHMS"])
+    levels = app.config["COMPRESS_LEVELS"]
+    min_size = app.config["COMPRESS_MIN_SIZE"]
+    mimetypes = set(app.config["COMPRESS_MIMETYPES"])
+
+    def after_request(response):
+        if not encodings or response.mimetype not in mimetypes:
+            return response
+        response.vary.add("Accept-Encoding")
+        if (response.is_streamed or response.direct_passthrough or "Content-Encoding" in response.headers
+                or response.status_code < 200 or response.status_code in (204, 206, 304)):
+            return response
+        encoding = request.accept_encodings.best_match(encodings)
+        if encoding is None:
+            return response
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        response.set_data(COMPRESSORS[encoding](data, levels[encoding]))
+        response.headers["Content-Encoding"] = encoding
+        if response.get_etag()[0]:
+            # The compressed body is a different representation, so a strong validator no longer applies as-is.
+            response.set_etag(response.get_etag()[0], weak=True)
+        return response
+
+    return after_request
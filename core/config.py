@@ -3,6 +3,38 @@ from settings import setting
 
 class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = True
+    COMPRESS_ALGORITHMS = ["br", "zstd", "gzip"]  # server preference order, unavailable libraries are skipped
+    COMPRESS_LEVELS = {"br": 4, "zstd": 3, "gzip": 6}
+    COMPRESS_MIN_SIZE = 500  # bytes, smaller bodies are sent as-is
+    COMPRESS_MIMETYPES = ["application/json", "text/html", "text/plain", "text/css", "application/javascript"]
+    RATELIMIT_ENABLED = True
+    RATELIMIT_STORAGE = "memory"  # or "sqlite:///<path>" to share buckets between worker processes on one host
+    RATELIMIT_POLICIES = {
+        "login": {"capacity": 5, "per_second": 5 / 60, "key": "ip"},
+        "register": {"capacity": 3, "per_second": 3 / 3600, "key": "ip"},
+        "refresh": {"capacity": 10, "per_second": 10 / 60, "key": "ip"},
+        "cart": {"capacity": 30, "per_second": 5, "key": "user"},
+    }
+    INVENTORY_LOW_STOCK_THRESHOLD = 5
+    EVENTS_HISTORY_SIZE = 1000  # events kept for Last-Event-ID replay
+    EVENTS_HEARTBEAT_SECONDS = 15
+    BOOK_CACHE_ENABLED = True  # cart service caches book lookups while subscribed to the book event stream
+    BOOK_SERVICE_URL = f"http://localhost:{setting.BOOK_PORT}"  # used by background jobs that have no request
+    CART_HOLD_ENABLED = False  # reserve stock in the book service when items are added to a cart
+    CART_HOLD_SECONDS = 15 * 60
+    CART_EXPIRY_SECONDS = 7 * 24 * 60 * 60  # unordered carts untouched for this long are purged
+    CART_SWEEPER_ENABLED = False  # run the sweeper in a thread of the cart service, else use `flask sweep-carts`
+    CART_SWEEP_INTERVAL = 60
+    CART_SWEEP_BATCH = 500
+    ORDER_ARCHIVE_AFTER_SECONDS = 0  # ordered carts older than this are moved to the order tables
+    ORDER_ARCHIVE_BATCH = 500
+    ACCESS_TOKEN_MINUTES = 15
+    REFRESH_TOKEN_DAYS = 7
+    VERIFY_TOKEN_HOURS = 4  # account verification link sent on registration
+    REVOCATION_SYNC_SECONDS = 5  # how stale the in-memory revocation list may get
+    REVOCATION_FULL_SYNC_SECONDS = 600  # full reload, drops expired entries
+    REVOCATION_SYNC_ID_WINDOW = 1000  # ids below the highest seen that are re-read, for rows that commit late
+    USER_SEARCH_MAX_LIMIT = 100
 
 
 class Development(Config):
@@ -13,6 +45,7 @@ class Development(Config):
 
 class Testing(Config):
     TESTING = True
+    RATELIMIT_ENABLED = False
     SQLALCHEMY_DATABASE_URI = None
 
 
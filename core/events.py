@@ -0,0 +1,110 @@
+import queue
+import secrets
+import threading
+from collections import deque
+
+
+class Subscription:
+    """
+    Queue of events for one subscriber. If the subscriber falls too far behind, it is marked as overflowed and
+    should disconnect and resume from the last event id it saw.
+    """
+
+    def __init__(self, max_pending):
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.overflowed = False
+
+    def push(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self.overflowed = True
+
+
+class EventBus:
+    """
+    In-process publish/subscribe bus with a bounded replay history.
+    The high bits of an event id hold a random epoch picked when the bus is created, so an id issued before a
+    restart, or by another process, is recognised as foreign and resuming from it gets a reset instead of a silent gap.
+    """
+
+    EPOCH_SHIFT = 32
+
+    def __init__(self, history_size=1000, max_pending=1000):
+        self.history = deque(maxlen=history_size)  # (event_id, event, data)
+        self.subscribers = set()
+        self.max_pending = max_pending
+        # Stays below 2**53 so ids survive JSON clients that parse numbers as doubles.
+        self.last_id = (secrets.randbits(20) + 1) << self.EPOCH_SHIFT
+        self.lock = threading.Lock()
+
+    def publish(self, event, data):
+        """
+        Description: Send an event to every subscriber and keep it for replay.
+        Parameter: event: event name, data: already serialized payload (str)
+        Return: the id given to the event
+        """
+        with self.lock:
+            self.last_id += 1
+            message = (self.last_id, event, data)
+            self.history.append(message)
+            subscribers = list(self.subscribers)
+        for subscription in subscribers:
+            subscription.push(message)
+        return message[0]
+
+    def subscribe(self, last_event_id=None):
+        """
+        Description: Register a subscriber, replaying the events after `last_event_id` when it was issued by this
+            bus and the history still covers them.
+        Parameter: last_event_id: int or None
+        Return: (subscription, replay, head_id) where replay is a list of past events, or None when the requested id
+            is no longer covered and the subscriber must resynchronise, and head_id is the last id published so far
+        """
+        subscription = Subscription(self.max_pending)
+        with self.lock:
+            replay = []
+            if last_event_id is not None:
+                oldest = self.history[0][0] - 1 if self.history else self.last_id
+                if (last_event_id >> self.EPOCH_SHIFT == self.last_id >> self.EPOCH_SHIFT
+                        and oldest <= last_event_id <= self.last_id):
+                    replay = [message for message in self.history if message[0] > last_event_id]
+                else:
+                    replay = None
+            self.subscribers.add(subscription)
+            return subscription, replay, self.last_id
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+
+def format_sse(event_id, event, data):
+    return f"id: {event_id}\nevent: {event}\ndata: {data}\n\n"
+
+
+def sse_stream(bus, last_event_id=None, heartbeat=15):
+    """
+    Description: Generator of server-sent event frames for one client. Replays missed events first, or sends a
+        `reset` event when they are no longer available, then a `ready` event carrying the current id, then live
+        events with comment heartbeats.
+    Parameter: bus: EventBus, last_event_id: id from the Last-Event-ID header, heartbeat: seconds between keep-alives
+    Return: generator of str frames
+    """
+    subscription, replay, head_id = bus.subscribe(last_event_id)
+    try:
+        if replay is None:
+            yield format_sse(head_id, "reset", "{}")
+        else:
+            for message in replay:
+                yield format_sse(*message)
+        yield format_sse(head_id, "ready", "{}")
+        while not subscription.overflowed:
+            try:
+                message = subscription.queue.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_sse(*message)
+    finally:
+        bus.unsubscribe(subscription)
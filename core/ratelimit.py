@@ -0,0 +1,145 @@
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import request, current_app, make_response
+
+
+class MemoryBucketStore:
+    """
+    Token buckets held in a process-local dict, in least recently used order.
+    Each key maps to [tokens, last_refill]; once max_keys buckets exist the least recently used one is evicted, so
+    memory stays bounded however many distinct clients show up.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.buckets = OrderedDict()
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+
+    def consume(self, key, capacity, refill_rate, cost=1):
+        """
+        Description: Take `cost` tokens from the bucket of `key`, refilling it first for the time elapsed.
+        Parameter: key: bucket key, capacity: max tokens, refill_rate: tokens per second, cost: tokens to take
+        Return: (allowed, retry_after) where retry_after is the seconds until enough tokens are available
+        """
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                while len(self.buckets) >= self.max_keys:
+                    self.buckets.popitem(last=False)
+                bucket = self.buckets[key] = [capacity, now]
+            else:
+                self.buckets.move_to_end(key)
+                bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * refill_rate)
+                bucket[1] = now
+            if bucket[0] < cost:
+                return False, (cost - bucket[0]) / refill_rate
+            bucket[0] -= cost
+            return True, 0
+
+
+class SQLiteBucketStore:
+    """
+    Token buckets kept in a local sqlite file so every worker process on the host shares the same limits.
+    Wall-clock time is used because monotonic clocks are not comparable across processes.
+    Each row records when its bucket is full again; such rows hold no state and are deleted every prune_interval
+    seconds, so the file only keeps clients that were throttled or seen recently.
+    """
+
+    def __init__(self, path, prune_interval=60):
+        self.path = path
+        self.local = threading.local()
+        self.prune_interval = prune_interval
+        self.pruned_at = time.time()
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS bucket "
+                         "(key TEXT PRIMARY KEY, tokens REAL, updated REAL, full_at REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_bucket_full_at ON bucket (full_at)")
+
+    def _connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+        return conn
+
+    def consume(self, key, capacity, refill_rate, cost=1):
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM bucket WHERE key = ?", (key,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * refill_rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            conn.execute("INSERT OR REPLACE INTO bucket (key, tokens, updated, full_at) VALUES (?, ?, ?, ?)",
+                         (key, tokens, now, now + (capacity - tokens) / refill_rate))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if now - self.pruned_at >= self.prune_interval:
+            self.pruned_at = now
+            conn.execute("DELETE FROM bucket WHERE full_at <= ?", (now,))
+        return allowed, 0 if allowed else (cost - tokens) / refill_rate
+
+
+def init_rate_limiter(app):
+    """
+    Description: Attach the bucket store selected by RATELIMIT_STORAGE to the app.
+        "memory" keeps buckets per process, "sqlite:///<path>" shares them between processes on the same host.
+    Parameter: app: Flask app
+    Return: None
+    """
+    storage = app.config["RATELIMIT_STORAGE"]
+    if storage == "memory":
+        store = MemoryBucketStore()
+    elif storage.startswith("sqlite:///"):
+        store = SQLiteBucketStore(storage[len("sqlite:///"):])
+    else:
+        raise ValueError(f"Unsupported RATELIMIT_STORAGE: {storage}")
+    app.extensions["rate_limiter"] = store
+
+
+def rate_limit(policy_name):
+    """
+    Description: Throttle the decorated endpoint with the named policy from RATELIMIT_POLICIES.
+        A policy is {"capacity": burst size, "per_second": refill rate, "key": "ip" or "user"}. "user" policies key on
+        the user id of the locally decoded access token, so the decorator goes above verify_user and throttled
+        requests never reach the user service; requests without a valid token fall back to the client IP.
+    Parameter: policy_name: key in RATELIMIT_POLICIES
+    Return: decorator, responding 429 with a Retry-After header once the bucket is empty
+    """
+
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            app = current_app._get_current_object()
+            if not app.config["RATELIMIT_ENABLED"]:
+                return func(*args, **kwargs)
+            policy = app.config["RATELIMIT_POLICIES"][policy_name]
+            payload = None
+            if policy["key"] == "user":
+                # Imported here because core.revocation needs core.db, which core imports this module before defining
+                from core.revocation import decode_access_token
+                payload = decode_access_token(request.headers.get("Authorization", ""))
+            if payload is not None:
+                key = f"{policy_name}:user:{payload['user_id']}"
+            else:
+                key = f"{policy_name}:ip:{request.remote_addr}"
+            allowed, retry_after = app.extensions["rate_limiter"].consume(key, policy["capacity"], policy["per_second"])
+            if not allowed:
+                response = make_response({"message": "Too many requests", "status": 429}, 429)
+                response.headers["Retry-After"] = str(math.ceil(retry_after))
+                return response
+            return func(*args, **kwargs)
+
+        wrapper.__name__ = func.__name__
+        return wrapper
+
+    return decorator
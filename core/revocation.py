@@ -0,0 +1,108 @@
+import hashlib
+import threading
+import time
+from datetime import datetime
+
+import jwt
+from flask import current_app
+
+from core import db
+from settings import setting
+
+
+class RevokedToken(db.Model):
+    """Denylisted token ids, shared by every service through the common database."""
+    __tablename__ = "revoked_token"
+
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    jti = db.Column(db.String(64), nullable=False, unique=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+def _digest(jti):
+    return int.from_bytes(hashlib.blake2b(jti.encode(), digest_size=8).digest(), "big")
+
+
+class RevocationList:
+    """
+    Process-local copy of the revoked_token table as a set of 64-bit jti digests.
+    Lookups are a hash and a set membership test. New rows are pulled incrementally by id at most every
+    REVOCATION_SYNC_SECONDS, and the set is rebuilt every REVOCATION_FULL_SYNC_SECONDS to drop expired entries.
+    Ids are handed out before commit, so a row can become visible after rows with higher ids; each incremental sync
+    therefore re-reads the last REVOCATION_SYNC_ID_WINDOW ids below the highest one seen.
+    """
+
+    def __init__(self):
+        self.digests = set()
+        self.last_id = 0
+        self.synced_at = self.full_synced_at = float("-inf")
+        self.lock = threading.Lock()
+
+    def add(self, jti):
+        self.digests.add(_digest(jti))
+
+    def is_revoked(self, jti):
+        """
+        Description: Check a token id against the denylist, syncing from the database first when due.
+        Parameter: jti: token id claim
+        Return: bool
+        """
+        self.maybe_sync()
+        return _digest(jti) in self.digests
+
+    def maybe_sync(self):
+        now = time.monotonic()
+        if now - self.synced_at < current_app.config["REVOCATION_SYNC_SECONDS"]:
+            return
+        # Only one request pays for the sync, the others keep using the current set
+        if not self.lock.acquire(blocking=False):
+            return
+        try:
+            full = now - self.full_synced_at >= current_app.config["REVOCATION_FULL_SYNC_SECONDS"]
+            self.sync(full)
+            if full:
+                self.full_synced_at = now
+        except Exception as e:
+            current_app.logger.warning("Revocation list sync failed: %s", e)
+            db.session.rollback()
+        finally:
+            self.synced_at = now
+            self.lock.release()
+
+    def sync(self, full=False):
+        """
+        Description: Load revoked token ids that have not expired yet, either all of them or only rows added since
+            the last sync, plus a window of ids just below, which catches rows that committed out of id order.
+        Parameter: full: rebuild the set instead of extending it
+        Return: None
+        """
+        after_id = 0 if full else self.last_id - current_app.config["REVOCATION_SYNC_ID_WINDOW"]
+        rows = db.session.execute(
+            db.select(RevokedToken.id, RevokedToken.jti)
+            .where(RevokedToken.id > after_id, RevokedToken.expires_at > datetime.utcnow())
+            .order_by(RevokedToken.id)).all()
+        digests = {_digest(row[1]) for row in rows}
+        if full:
+            self.digests = digests
+        else:
+            self.digests |= digests
+        if rows:
+            self.last_id = max(self.last_id, rows[-1][0])
+
+
+revocation_list = RevocationList()
+
+
+def decode_access_token(token):
+    """
+    Description: Validate an access token locally: signature, expiry, token type and the revocation list.
+    Parameter: token: str
+    Return: the token payload, or None if the token must be rejected
+    """
+    try:
+        payload = jwt.decode(token, key=setting.JWT_KEY, algorithms=[setting.ALGORITHM])
+    except jwt.PyJWTError:
+        return None
+    if payload.get("type") != "access" or revocation_list.is_revoked(payload.get("jti", "")):
+        return None
+    return payload
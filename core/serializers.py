@@ -0,0 +1,51 @@
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the stdlib encoder
+    orjson = None
+
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider backed by orjson when it is installed.
+    Falls back to Flask's default stdlib encoder otherwise, so behaviour stays the same without the dependency.
+    """
+    sort_keys = False
+
+    def _options(self, indent=None, sort_keys=None):
+        option = orjson.OPT_INDENT_2 if indent else 0
+        if self.sort_keys if sort_keys is None else sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None:
+            return super().dumps(obj, **kwargs)
+        option = self._options(kwargs.get("indent"), kwargs.get("sort_keys"))
+        return orjson.dumps(obj, default=kwargs.get("default", self.default), option=option).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=self.default, option=self._options(indent=pretty))
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
+
+
+def output_json(data, code, headers=None):
+    """
+    Description: flask_restx representation for application/json that encodes through the app's JSON provider
+        instead of flask_restx's own stdlib json.dumps call.
+    """
+    resp = current_app.json.response(data)
+    resp.status_code = code
+    resp.headers.extend(headers or {})
+    return resp
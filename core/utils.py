@@ -2,6 +2,8 @@ from flask import request, jsonify, make_response
 from werkzeug.exceptions import Unauthorized
 import httpx
 from settings import setting
+from core import db
+from core.revocation import decode_access_token
 
 
 def verify_user(func):
@@ -9,6 +11,9 @@ def verify_user(func):
         token = request.headers.get("Authorization")
         if not token:
             return make_response({"message": "Token not found"}, 404)
+        # Expired, revoked or non-access tokens are refused locally, before asking the user service
+        if decode_access_token(token) is None:
+            return make_response({"msg": "Invalid or revoked token"}, 401)
         base_url = ":".join(request.url_root.split(":")[:-1])
         response = httpx.get(f"{base_url}:{setting.USER_PORT}/login", params={"token": token})
         if response.status_code == 200:
@@ -26,6 +31,8 @@ def verify_superuser(func):
         token = request.headers.get("Authorization")
         if not token:
             return jsonify({"message": "Token not found"}), 404
+        if decode_access_token(token) is None:
+            return jsonify({"msg": "Invalid or revoked token"}), 401
 
         base_url = ":".join(request.url_root.split(":")[:-1])
         response = httpx.get(f"{base_url}:{setting.USER_PORT}/login", params={"token": token})
@@ -52,3 +59,20 @@ def exception_handler(function):
 
     wrapper.__name__ = function.__name__
     return wrapper
+
+
+def select_dicts(model, *criteria, columns=None, order_by=None, limit=None):
+    """
+    Description: Read rows of a model as plain dicts straight from column tuples, skipping ORM object construction.
+        Meant for read-only listings where the instances would only be turned into dicts anyway.
+    Parameter: model: db.Model class, criteria: optional SQLAlchemy filter expressions,
+        columns: optional column names to project (all columns by default), order_by/limit: optional ordering and cap
+    Return: list of dicts keyed by column name
+    """
+    table_columns = model.__table__.columns
+    stmt = db.select(*(table_columns[name] for name in columns) if columns else table_columns).where(*criteria)
+    if order_by is not None:
+        stmt = stmt.order_by(order_by)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return [row._asdict() for row in db.session.execute(stmt)]
@@ -11,5 +11,6 @@ class Settings(BaseSettings):
     EMAIL_USER: str
     EMAIL_PASS: str
     BOOK_PORT: int
+    ORDER_PARTITIONING: bool = False
 
 setting = Settings()
@@ -1,9 +1,12 @@
+from calendar import timegm
 from core import db
 from passlib.hash import pbkdf2_sha256
 
 
 class User(db.Model):
     __tablename__ = "user"
+    # Columns that may be returned to clients, the same ones to_dict exposes
+    public_fields = ("id", "firstname", "lastname", "username", "email", "is_superuser", "location", "phone")
 
     id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
     username = db.Column(db.String(50), nullable=False, unique=True)
@@ -15,6 +18,15 @@ class User(db.Model):
     phone = db.Column(db.BigInteger)
     firstname = db.Column(db.String(50))
     lastname = db.Column(db.String(50))
+    tokens_valid_after = db.Column(db.DateTime)  # tokens issued before this are rejected, set by logout of all sessions
+
+    # Case-insensitive prefix search on username/email; text_pattern_ops lets PostgreSQL use them for LIKE 'abc%'
+    __table_args__ = (
+        db.Index("ix_user_username_lower", db.func.lower(username).label("username_lower"),
+                 postgresql_ops={"username_lower": "text_pattern_ops"}),
+        db.Index("ix_user_email_lower", db.func.lower(email).label("email_lower"),
+                 postgresql_ops={"email_lower": "text_pattern_ops"}),
+    )
 
     @property
     def to_dict(self):
@@ -49,3 +61,15 @@ class User(db.Model):
             bool: True if the password matches, False otherwise.
         """
         return pbkdf2_sha256.verify(raw_pass, self.password)
+
+    def accepts_token(self, payload):
+        """
+        Verify a decoded token was issued after the user last logged out of all sessions.
+        iat only has whole seconds, so tokens issued in the same second as the logout are rejected too.
+        Args:
+            payload (dict): The decoded token payload.
+        Returns:
+            bool: True if the token is still valid for this user, False otherwise.
+        """
+        return self.tokens_valid_after is None or payload.get("iat", 0) > timegm(
+            self.tokens_valid_after.utctimetuple())
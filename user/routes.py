@@ -1,25 +1,34 @@
 from core import create_app, db
 from flask import request, jsonify, make_response
 from .models import User
-from .schemas import UserValidator
-from .utils import send_email, decode_token, encode_jwt
+from .schemas import UserValidator, UserBatchValidator
+from .utils import send_email, decode_token, encode_jwt, revoke_token, superuser_required
 from flask_restx import Api, Resource
 from .swagger_user_schema import models
 from settings import setting
+from core.serializers import output_json
+from core.utils import select_dicts
+from core.ratelimit import rate_limit
+from core.revocation import decode_access_token, RevokedToken
+from datetime import datetime
 
 app = create_app(config_mode="development")
 api = Api(app,
           default='Registration and Login',
           title='User',
           default_label='APIs',
-          doc='/docs'
+          security='Bearer',
+          doc='/docs',
+          authorizations={"Bearer": {"type": "apiKey", "in": "header", "name": "authorization"}}
           )
+api.representation('application/json')(output_json)
 
 
 @api.route('/user')
 class UserRegistrationAPI(Resource):
 
     @api.doc(body=api.model('user_register_schema', models.get('user_register_schema')))
+    @rate_limit("register")
     def post(self):
         """
         Description: Handle New User Registration.
@@ -42,7 +51,7 @@ class UserRegistrationAPI(Resource):
             db.session.commit()
 
             # Generates a token for verification
-            token = encode_jwt(user.id)
+            token = encode_jwt(user.id, token_type="verify")
 
             # Sends mail having token in the mail to user for verification while registration
             base_url = ":".join(request.url_root.split(":")[:-1])
@@ -66,6 +75,8 @@ class UserRegistrationAPI(Resource):
         if not token:
             return make_response(jsonify({"msg": "Token data is missing", "status": 404})), 404
         payload = decode_token(token)  # Decode the token
+        if payload.get('type') != 'verify':
+            return make_response(jsonify({"msg": "Invalid verification token", "status": 401}), 401)
         user_id = payload.get('user_id')
         if not user_id:
             return make_response(jsonify({"Message": "User ID Not Found from token", "status": 404}), 404)
@@ -82,6 +93,7 @@ class UserRegistrationAPI(Resource):
 class UserLoginAPI(Resource):
 
     @api.doc(body=api.model('user_login_schema', models.get('user_login_schema')))
+    @rate_limit("login")
     def post(self):
         """
         Description: Handle's user login.
@@ -93,10 +105,11 @@ class UserLoginAPI(Resource):
         try:
             data = request.get_json()
             user = User.query.filter_by(username=data['username']).first()
-            if not (user or user.verify_pass(data.get("password")) or user.is_verified):
+            if not (user and user.verify_pass(data.get("password")) and user.is_verified):
                 return make_response(jsonify({"msg": "Invalid Username or Password", "status": 401}), 401)
-            token = encode_jwt(user.id)
-            return make_response(jsonify({"message": "Login Successfully", "token": token, "status": 200}), 200)
+            return make_response(jsonify({"message": "Login Successfully", "token": encode_jwt(user.id),
+                                          "refresh_token": encode_jwt(user.id, token_type="refresh"), "status": 200}),
+                                 200)
         except Exception as e:
             return make_response(jsonify({"message": "Unable to Login", "error": str(e)}), 400)
 
@@ -111,18 +124,150 @@ class UserLoginAPI(Resource):
             if not token:
                 return make_response(jsonify({'message': 'Authentication token is missing', "status": 401}), 401)
 
-            # Decode and verify the JWT token
-            payload = decode_token(token)
+            # Decode and verify the JWT token, rejecting refresh/verify tokens and revoked ones
+            payload = decode_access_token(token)
+            if payload is None:
+                return make_response(jsonify({'message': 'Invalid or revoked token', "status": 401}), 401)
 
             # Access user information from the token
             user_id = payload["user_id"]
 
-            # Check if the user exists in the database
+            # Check if the user exists in the database and has not logged out of all sessions since
             user = User.query.get(user_id)
             if not user:
                 return make_response(jsonify({'message': 'User not found', "status": 404}), 404)
+            if not user.accepts_token(payload):
+                return make_response(jsonify({'message': 'Invalid or revoked token', "status": 401}), 401)
 
             # Return user data with a 200 OK response
             return make_response(user.to_dict, 200)
         except Exception as e:
             return jsonify({'message': str(e)}), 400
+
+
+@api.route('/token/refresh')
+class TokenRefreshAPI(Resource):
+
+    @api.doc(body=api.model('token_refresh_schema', models.get('token_refresh_schema')))
+    @rate_limit("refresh")
+    def post(self):
+        """
+        Description: Exchange a refresh token for a new access token and refresh token.
+            The refresh token used is revoked, so each one can only be exchanged once.
+        Return: JSON response with the new token pair.
+        """
+        try:
+            payload = decode_token(request.get_json()['refresh_token'])
+            # Refreshing is rare, so the denylist table is checked directly instead of the in-memory copy
+            if payload.get('type') != 'refresh' or RevokedToken.query.filter_by(jti=payload['jti']).first():
+                return make_response(jsonify({"msg": "Invalid or revoked refresh token", "status": 401}), 401)
+            user = User.query.get(payload['user_id'])
+            if not (user and user.is_verified and user.accepts_token(payload)):
+                return make_response(jsonify({"msg": "Invalid or revoked refresh token", "status": 401}), 401)
+            revoke_token(payload)
+            return make_response(jsonify({"message": "Token Refreshed", "token": encode_jwt(user.id),
+                                          "refresh_token": encode_jwt(user.id, token_type="refresh"), "status": 200}),
+                                 200)
+        except Exception as e:
+            return make_response(jsonify({"message": "Unable to Refresh Token", "error": str(e)}), 400)
+
+
+@api.route('/logout')
+class LogoutAPI(Resource):
+
+    @api.doc(params={'token': 'Access token to revoke', 'all': 'true to revoke every token of the user'})
+    @api.doc(body=api.model('token_refresh_schema', models.get('token_refresh_schema')))
+    def post(self):
+        """
+        Description: Revoke the given access token and, if sent in the body, the refresh token issued with it.
+            With all=true every token issued to the user so far is rejected.
+        Return: JSON response with logout status.
+        """
+        try:
+            payload = decode_access_token(request.args.get('token', ''))
+            if payload is None:
+                return make_response(jsonify({"msg": "Invalid or revoked token", "status": 401}), 401)
+            user = User.query.get(payload['user_id'])
+            if not (user and user.accepts_token(payload)):
+                return make_response(jsonify({"msg": "Invalid or revoked token", "status": 401}), 401)
+            if request.args.get('all') == 'true':
+                user.tokens_valid_after = datetime.utcnow()
+                db.session.commit()
+            revoke_token(payload)
+            refresh_token = (request.get_json(silent=True) or {}).get('refresh_token')
+            if refresh_token:
+                refresh_payload = decode_token(refresh_token)
+                if refresh_payload.get('type') == 'refresh' and refresh_payload['user_id'] == user.id:
+                    revoke_token(refresh_payload)
+            return make_response(jsonify({"message": "Logged Out", "status": 200}), 200)
+        except Exception as e:
+            return make_response(jsonify({"message": "Unable to Logout", "error": str(e)}), 400)
+
+
+def projected_fields(fields):
+    """
+    Description: Validate requested user fields against the public ones.
+    Parameter: fields: list of field names or None for all public fields
+    Return: tuple of field names, always including id; raises ValueError for unknown or private fields
+    """
+    if not fields:
+        return User.public_fields
+    unknown = set(fields) - set(User.public_fields)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return tuple(dict.fromkeys(["id", *fields]))
+
+
+@api.route('/users/batch')
+class UserBatchAPI(Resource):
+
+    @api.doc(body=api.model('user_batch_schema', models.get('user_batch_schema')))
+    @superuser_required
+    def post(self, **kwargs):
+        """
+        Description: Resolve many users by ID in a single query (superuser only).
+            Expects JSON with 'ids' and optionally 'fields' to limit the returned columns.
+        Return: JSON response with the found users and the IDs that do not exist.
+        """
+        try:
+            serializer = UserBatchValidator(**request.get_json())
+            ids = set(serializer.ids)
+            users = select_dicts(User, User.id.in_(ids), columns=projected_fields(serializer.fields))
+            missing = sorted(ids - {user['id'] for user in users})
+            return make_response(jsonify({"message": "Users Retrieved", "status": 200, "data": users,
+                                          "missing": missing}), 200)
+        except Exception as e:
+            return make_response(jsonify({"message": "Unable to Retrieve Users", "error": str(e)}), 400)
+
+
+@api.route('/users/search')
+class UserSearchAPI(Resource):
+
+    @api.doc(params={'q': 'Case-insensitive prefix of username or email',
+                     'after': 'Last user ID of the previous page', 'limit': 'Page size',
+                     'fields': 'Comma separated fields to return'})
+    @superuser_required
+    def get(self, **kwargs):
+        """
+        Description: Search users by username or email prefix (superuser only), paginated by user ID.
+            Pass the returned next_after as 'after' to get the following page.
+        Return: JSON response with the page of users and the cursor for the next page.
+        """
+        try:
+            query = request.args.get('q', '').lower()
+            after = request.args.get('after', 0, type=int)
+            limit = max(1, min(request.args.get('limit', 20, type=int), app.config["USER_SEARCH_MAX_LIMIT"]))
+            fields = request.args.get('fields')
+            columns = projected_fields(fields.split(',') if fields else None)
+
+            criteria = [User.id > after]
+            if query:
+                pattern = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+                criteria.append(db.or_(db.func.lower(User.username).like(pattern, escape='\\'),
+                                       db.func.lower(User.email).like(pattern, escape='\\')))
+            users = select_dicts(User, *criteria, columns=columns, order_by=User.id, limit=limit)
+            next_after = users[-1]['id'] if len(users) == limit else None
+            return make_response(jsonify({"message": "Users Retrieved", "status": 200, "data": users,
+                                          "next_after": next_after}), 200)
+        except Exception as e:
+            return make_response(jsonify({"message": "Unable to Search Users", "error": str(e)}), 400)
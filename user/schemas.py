@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field, field_validator
-from typing import Optional
+from typing import Optional, List
 import re
 
 
@@ -42,3 +42,8 @@ class UserValidator(BaseModel):
         ):
             raise ValueError("Password must meet the specified criteria")
         return value
+
+
+class UserBatchValidator(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=1000, description="User IDs to resolve, at most 1000")
+    fields: Optional[List[str]] = Field(None, description="Fields to return, all public fields by default")
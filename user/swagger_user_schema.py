@@ -14,5 +14,12 @@ models = {
     "user_login_schema": {
         "username": fields.String,
         "password": fields.String
+    },
+    "token_refresh_schema": {
+        "refresh_token": fields.String
+    },
+    "user_batch_schema": {
+        "ids": fields.List(fields.Integer),
+        "fields": fields.List(fields.String)
     }
 }
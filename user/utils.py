@@ -1,24 +1,53 @@
 from datetime import datetime, timedelta
+import uuid
 import jwt
+from flask import current_app, request, jsonify, make_response
+from core import db
+from core.revocation import RevokedToken, revocation_list, decode_access_token
+from .models import User
 from settings import setting
 import smtplib
 from email.message import EmailMessage
 
 
-def encode_jwt(user_id):
+def encode_jwt(user_id, token_type="access"):
     """
-    Description: Encode a JWT token with user_id and expiration time.
-    Parameter: user_id: int from the db
+    Description: Encode a JWT token with user_id, token type, a unique token id and expiration time.
+        Access tokens are short lived, refresh tokens are exchanged for new pairs at /token/refresh and verify tokens
+        go in the account verification mail.
+    Parameter: user_id: int from the db, token_type: "access", "refresh" or "verify"
     Return: [jwt_token: Encoded JWT Token]
     """
+    lifetimes = {
+        "access": timedelta(minutes=current_app.config["ACCESS_TOKEN_MINUTES"]),
+        "refresh": timedelta(days=current_app.config["REFRESH_TOKEN_DAYS"]),
+        "verify": timedelta(hours=current_app.config["VERIFY_TOKEN_HOURS"]),
+    }
+    now = datetime.utcnow()
     token_payload = {
         'user_id': user_id,
-        'exp': datetime.utcnow() + timedelta(hours=4)  # Token expiration time
+        'type': token_type,
+        'jti': uuid.uuid4().hex,
+        'iat': now,
+        'exp': now + lifetimes[token_type]  # Token expiration time
     }
     jwt_token = jwt.encode(token_payload, key=setting.JWT_KEY, algorithm=setting.ALGORITHM)
     return jwt_token
 
 
+def revoke_token(payload):
+    """
+    Description: Add a decoded token to the revocation list until it would have expired anyway.
+    Parameter: payload: decoded token payload with jti and exp
+    Return: None
+    """
+    db.session.add(RevokedToken(jti=payload['jti'], expires_at=datetime.utcfromtimestamp(payload['exp'])))
+    # Expired entries no longer need to be denied, keep the table small
+    RevokedToken.query.filter(RevokedToken.expires_at < datetime.utcnow()).delete(synchronize_session=False)
+    db.session.commit()
+    revocation_list.add(payload['jti'])
+
+
 def decode_token(token):
     """
     Description: Decode a JWT token and return the payload.
@@ -32,6 +61,25 @@ def decode_token(token):
         raise ex
 
 
+def superuser_required(func):
+    """
+    Description: Allow only superusers, checking the access token in the Authorization header within the user
+        service itself instead of calling back into /login like core.utils.verify_superuser does.
+    """
+    def wrapper(*args, **kwargs):
+        payload = decode_access_token(request.headers.get("Authorization", ""))
+        user = User.query.get(payload["user_id"]) if payload else None
+        if not (user and user.accepts_token(payload)):
+            return make_response(jsonify({"msg": "Invalid or revoked token", "status": 401}), 401)
+        if not user.is_superuser:
+            return make_response(jsonify({"Message": "Permission denied", "status": 403}), 403)
+        kwargs.update(current_user=user.to_dict)
+        return func(*args, **kwargs)
+
+    wrapper.__name__ = func.__name__
+    return wrapper
+
+
 def send_email(email, link):
     """
     Description: